@@ -4,17 +4,20 @@ Serves Apple Notes over a REST API for companion apps.
 """
 
 import asyncio
+import hashlib
 import socket
 from contextlib import asynccontextmanager
-from dataclasses import asdict
+from dataclasses import dataclass
 
-from fastapi import FastAPI, HTTPException
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from zeroconf import ServiceInfo, Zeroconf
 
-from notes_reader import get_folders, get_notes, get_note
-from notes_writer import create_note, edit_note, delete_note
+from notes_reader import get_folders, get_notes, get_note_etag, get_note_with_etag, note_exists
+from notes_writer import create_note, edit_note, delete_note, start_osascript, stop_osascript
 
 
 # --- mDNS setup ---
@@ -66,13 +69,27 @@ def _unregister_mdns():
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     await asyncio.to_thread(_register_mdns)
+    await start_osascript()
     yield
+    await stop_osascript()
     await asyncio.to_thread(_unregister_mdns)
 
 
 # --- FastAPI app ---
 
-app = FastAPI(title="Apple Notes Sync", version="1.0.0", lifespan=lifespan)
+class OrjsonResponse(JSONResponse):
+    """JSON response serialised with orjson, which handles dataclasses natively."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(
+    title="Apple Notes Sync",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=OrjsonResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -89,51 +106,92 @@ class CreateNoteRequest(BaseModel):
     title: str
     body: str
     folder: str = "Notes"
+    folder_id: int | None = None
 
 
 class EditNoteRequest(BaseModel):
     body: str
 
 
+# --- Response models ---
+
+@dataclass(slots=True)
+class NoteListItem:
+    """A note as returned by the listing endpoint (no body)."""
+    id: int
+    title: str
+    snippet: str
+    folder: str
+    created: str
+    modified: str
+    is_pinned: bool
+    has_checklist: bool
+
+
 # --- Read endpoints ---
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the ETag."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
 @app.get("/")
 def health():
     return {"status": "ok", "service": "apple-notes-sync"}
 
 
 @app.get("/folders")
-def list_folders():
-    return get_folders()
+def list_folders(request: Request):
+    # Tag the serialised listing itself: note counts can change (moves,
+    # deletions) without any single modification date changing.
+    content = orjson.dumps(get_folders())
+    etag = f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content, media_type="application/json", headers={"ETag": etag})
 
 
 @app.get("/notes")
 def list_notes(folder_id: int | None = None):
     """List all notes. Optionally filter by folder_id."""
     notes = get_notes(folder_id)
-    # Return without body for listing (lighter payload)
-    return [
-        {
-            "id": n.id,
-            "title": n.title,
-            "snippet": n.snippet,
-            "folder": n.folder,
-            "created": n.created,
-            "modified": n.modified,
-            "is_pinned": n.is_pinned,
-            "has_checklist": n.has_checklist,
-        }
+    # Return without body for listing (lighter payload). Returning the
+    # response directly lets orjson serialise the dataclasses without
+    # FastAPI's jsonable_encoder pass.
+    return OrjsonResponse([
+        NoteListItem(
+            id=n.id,
+            title=n.title,
+            snippet=n.snippet,
+            folder=n.folder,
+            created=n.created,
+            modified=n.modified,
+            is_pinned=n.is_pinned,
+            has_checklist=n.has_checklist,
+        )
         for n in notes
-    ]
+    ])
 
 
 @app.get("/notes/{note_id}")
-def read_note(note_id: int):
+def read_note(note_id: int, request: Request):
     """Get a single note with full body content."""
-    note = get_note(note_id)
-    if note is None:
+    # Conditional requests get a cheap metadata probe first, so unchanged
+    # notes skip body decoding
+    if "if-none-match" in request.headers:
+        etag = get_note_etag(note_id)
+        if etag is not None and _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    result = get_note_with_etag(note_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Note not found")
-    return asdict(note)
+    note, etag = result
+    # orjson serialises the dataclass directly, no asdict() copy
+    return OrjsonResponse(note, headers={"ETag": etag})
 
 
 # --- Write endpoints ---
@@ -142,7 +200,7 @@ def read_note(note_id: int):
 async def create_note_endpoint(req: CreateNoteRequest):
     """Create a new note."""
     try:
-        result = await create_note(req.title, req.body, req.folder)
+        result = await create_note(req.title, req.body, req.folder, req.folder_id)
         return result
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -151,9 +209,9 @@ async def create_note_endpoint(req: CreateNoteRequest):
 @app.put("/notes/{note_id}")
 async def edit_note_endpoint(note_id: int, req: EditNoteRequest):
     """Edit a note's body content."""
-    # Verify the note exists first
-    note = get_note(note_id)
-    if note is None:
+    # Verify the note exists first. Off the event loop: the connection pool
+    # can block waiting for a free connection.
+    if not await asyncio.to_thread(note_exists, note_id):
         raise HTTPException(status_code=404, detail="Note not found")
     try:
         await edit_note(note_id, req.body)
@@ -165,8 +223,7 @@ async def edit_note_endpoint(note_id: int, req: EditNoteRequest):
 @app.delete("/notes/{note_id}")
 async def delete_note_endpoint(note_id: int):
     """Delete a note (moves to Recently Deleted)."""
-    note = get_note(note_id)
-    if note is None:
+    if not await asyncio.to_thread(note_exists, note_id):
         raise HTTPException(status_code=404, detail="Note not found")
     try:
         await delete_note(note_id)
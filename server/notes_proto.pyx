@@ -0,0 +1,108 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Native fast path for Apple Notes protobuf text extraction.
+Build in place with: cythonize -i notes_proto.pyx
+"""
+
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_GET_SIZE
+from libc.stdint cimport uint64_t
+
+
+cdef inline Py_ssize_t _read_varint(const unsigned char* p, Py_ssize_t pos,
+                                    Py_ssize_t end, uint64_t* value) noexcept:
+    """Read a protobuf varint at p[pos], store it in value, return the new pos."""
+    cdef uint64_t result = 0
+    cdef unsigned int shift = 0
+    cdef unsigned char b
+    while pos < end:
+        b = p[pos]
+        pos += 1
+        if shift < 64:
+            result |= (<uint64_t>(b & 0x7F)) << shift
+        if not (b & 0x80):
+            break
+        shift += 7
+    value[0] = result
+    return pos
+
+
+cdef inline Py_ssize_t _next_field(const unsigned char* p, Py_ssize_t pos, Py_ssize_t end,
+                                   uint64_t* field_number, Py_ssize_t* start,
+                                   Py_ssize_t* length) noexcept:
+    """Advance past one field starting at p[pos].
+
+    For length-delimited fields, start/length describe the payload; otherwise
+    length is -1. Returns -1 when the buffer is exhausted or malformed.
+    """
+    cdef uint64_t tag, value
+    cdef unsigned int wire_type
+    if pos >= end:
+        return -1
+    pos = _read_varint(p, pos, end, &tag)
+    field_number[0] = tag >> 3
+    wire_type = tag & 0x07
+    length[0] = -1
+
+    if wire_type == 0:  # varint
+        return _read_varint(p, pos, end, &value)
+    elif wire_type == 2:  # length-delimited (string, bytes, sub-message)
+        pos = _read_varint(p, pos, end, &value)
+        if value > <uint64_t>(end - pos):
+            return -1
+        start[0] = pos
+        length[0] = <Py_ssize_t>value
+        return pos + length[0]
+    elif wire_type == 5:  # 32-bit
+        return pos + 4
+    elif wire_type == 1:  # 64-bit
+        return pos + 8
+    return -1
+
+
+def extract_text(bytes data) -> str:
+    """Extract note text from decompressed protobuf: root -> field 2 -> field 3 -> field 2.
+
+    Native version of notes_reader._try_structured_parse. Returns "" if the
+    expected structure is not present.
+    """
+    cdef const unsigned char* p = <const unsigned char*>PyBytes_AS_STRING(data)
+    cdef Py_ssize_t end = PyBytes_GET_SIZE(data)
+    cdef Py_ssize_t pos = 0, start = 0, length = -1
+    cdef Py_ssize_t store_end, para_pos, para_end, text_start = 0, text_length = -1
+    cdef uint64_t field_number
+    cdef bytearray buf = bytearray()
+    cdef bint first = True
+
+    # Root: locate the first length-delimited field 2 (the note store)
+    while True:
+        pos = _next_field(p, pos, end, &field_number, &start, &length)
+        if pos < 0:
+            return ""
+        if field_number == 2 and length >= 0:
+            break
+
+    # Note store: every length-delimited field 3 is a paragraph/text run
+    pos = start
+    store_end = start + length
+    while True:
+        pos = _next_field(p, pos, store_end, &field_number, &start, &length)
+        if pos < 0:
+            break
+        if field_number != 3 or length < 0:
+            continue
+
+        # Paragraph: field 2 contains the text string for this run
+        para_pos = start
+        para_end = start + length
+        while True:
+            para_pos = _next_field(p, para_pos, para_end, &field_number,
+                                   &text_start, &text_length)
+            if para_pos < 0:
+                break
+            if field_number == 2 and text_length >= 0:
+                if not first:
+                    buf += b"\n"
+                buf += data[text_start:text_start + text_length]
+                first = False
+
+    return buf.decode("utf-8", errors="replace")
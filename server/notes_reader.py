@@ -3,13 +3,24 @@ Apple Notes SQLite database reader.
 Reads notes from the local macOS Apple Notes database.
 """
 
-import gzip
+import hashlib
 import os
+import queue
 import sqlite3
+import threading
 import zlib
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+try:
+    # Optional Cython fast path for protobuf text extraction (see notes_proto.pyx)
+    from notes_proto import extract_text as _native_extract_text
+except ImportError:
+    _native_extract_text = None
 
 # Apple's Core Data epoch: 2001-01-01 00:00:00 UTC
 APPLE_EPOCH = datetime(2001, 1, 1, tzinfo=timezone.utc)
@@ -19,7 +30,7 @@ DB_PATH = os.path.expanduser(
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class Note:
     id: int
     title: str
@@ -32,7 +43,7 @@ class Note:
     has_checklist: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Folder:
     id: int
     name: str
@@ -43,13 +54,21 @@ def _apple_timestamp_to_iso(ts) -> str | None:
     """Convert Apple Core Data timestamp to ISO 8601 string."""
     if ts is None:
         return None
-    from datetime import timedelta
-    dt = APPLE_EPOCH + timedelta(seconds=ts)
-    return dt.isoformat()
+    return (APPLE_EPOCH + timedelta(seconds=ts)).isoformat()
 
 
-def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+def _read_varint(data: memoryview, pos: int) -> tuple[int, int]:
     """Read a protobuf varint, return (value, new_pos)."""
+    # Fast path: most tags and lengths fit in a single byte
+    if pos < len(data):
+        b = data[pos]
+        if b < 0x80:
+            return b, pos + 1
+    return _read_varint_slow(data, pos)
+
+
+def _read_varint_slow(data: memoryview, pos: int) -> tuple[int, int]:
+    """Read a multi-byte protobuf varint, return (value, new_pos)."""
     result = 0
     shift = 0
     while pos < len(data):
@@ -62,34 +81,54 @@ def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
     return result, pos
 
 
-def _parse_protobuf(data: bytes) -> dict:
-    """Minimally parse protobuf wire format into {field_number: [values]}."""
-    fields: dict[int, list] = {}
+def _length_delimited_fields(data: memoryview, field: int) -> Iterator[memoryview]:
+    """Yield the payload of each length-delimited `field` in a protobuf message.
+
+    Every other field is skipped by advancing past it, without slicing it
+    out. Stops at the first truncated or unknown field.
+    """
     pos = 0
-    while pos < len(data):
-        try:
-            tag, pos = _read_varint(data, pos)
-        except Exception:
-            break
-        field_number = tag >> 3
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = _read_varint_slow(data, pos)
         wire_type = tag & 0x07
 
         if wire_type == 0:  # varint
             _, pos = _read_varint(data, pos)
         elif wire_type == 2:  # length-delimited (string, bytes, sub-message)
             length, pos = _read_varint(data, pos)
-            if pos + length > len(data):
-                break
-            value = data[pos:pos + length]
-            fields.setdefault(field_number, []).append(value)
+            if pos + length > end:
+                return
+            if tag >> 3 == field:
+                yield data[pos:pos + length]
             pos += length
         elif wire_type == 5:  # 32-bit
             pos += 4
         elif wire_type == 1:  # 64-bit
             pos += 8
         else:
-            break
-    return fields
+            return
+
+
+def _walk_notes_protobuf(root: memoryview) -> list[memoryview]:
+    """Collect the text runs at root -> field 2 -> field 3 -> field 2.
+
+    Only descends into the fields on that path. Every level is a slice of
+    the same view, so the returned runs are zero-copy views into the
+    decompressed buffer.
+    """
+    for note_store in _length_delimited_fields(root, 2):
+        # Field 3 holds the paragraphs; field 2 of each is its text string
+        return [
+            text
+            for para in _length_delimited_fields(note_store, 3)
+            for text in _length_delimited_fields(para, 2)
+        ]
+    return []
 
 
 def _extract_text_from_protobuf(data: bytes) -> str:
@@ -101,14 +140,15 @@ def _extract_text_from_protobuf(data: bytes) -> str:
     text strings from the raw decompressed data.
     """
     try:
-        decompressed = gzip.decompress(data)
-    except Exception:
-        try:
-            decompressed = zlib.decompress(data)
-        except Exception:
-            return ""
+        # 32 + MAX_WBITS auto-detects gzip or zlib framing in a single call
+        decompressed = zlib.decompress(data, wbits=32 + zlib.MAX_WBITS)
+    except zlib.error:
+        return ""
 
-    text = _try_structured_parse(decompressed)
+    if _native_extract_text is not None:
+        text = _native_extract_text(decompressed)
+    else:
+        text = _try_structured_parse(decompressed)
     if not text:
         text = _fallback_extract_text(decompressed)
 
@@ -122,58 +162,105 @@ def _extract_text_from_protobuf(data: bytes) -> str:
 
 def _try_structured_parse(decompressed: bytes) -> str:
     """Try structured protobuf parse: root -> field 2 -> field 3 -> field 2."""
-    root = _parse_protobuf(decompressed)
-    if 2 not in root:
-        return ""
-
-    note_store = _parse_protobuf(root[2][0])
-    # Field 3 contains the attributed string with paragraphs
-    if 3 not in note_store:
-        return ""
-
-    # Each entry in field 3 is a paragraph/text run sub-message
-    text_parts = []
-    for para_data in note_store[3]:
-        para = _parse_protobuf(para_data)
-        # Field 2 contains the text string for this run
-        if 2 in para:
-            for text_bytes in para[2]:
-                try:
-                    text_parts.append(text_bytes.decode("utf-8"))
-                except UnicodeDecodeError:
-                    pass
-
-    return "\n".join(text_parts) if text_parts else ""
+    # The UTF-8 runs are only copied out of the buffer here: joined into one
+    # bytes object and decoded once
+    runs = _walk_notes_protobuf(memoryview(decompressed))
+    return b"\n".join(runs).decode("utf-8", errors="replace")
+
+
+# Byte translation table for _fallback_extract_text: printable ASCII, ASCII
+# whitespace (everything str.isspace() accepts: \t \n \v \f \r and
+# 0x1C-0x1F) and any byte >= 0x80 (part of a UTF-8 sequence) map to
+# themselves, everything else maps to NUL.
+_FALLBACK_TABLE = bytes(
+    b if (0x20 <= b < 0x7F or chr(b).isspace() or b >= 0x80) else 0
+    for b in range(256)
+)
 
 
 def _fallback_extract_text(decompressed: bytes) -> str:
     """Fallback: extract printable text strings from raw decompressed data.
 
-    Scans for sequences of printable UTF-8 characters (minimum 4 chars)
-    and joins them together. Used when structured protobuf parsing fails.
+    Scans for runs of printable bytes (minimum 4 bytes) and joins them
+    together. Used when structured protobuf parsing fails.
     """
-    import re
-    # Try decoding as UTF-8, replacing errors
-    raw_text = decompressed.decode("utf-8", errors="replace")
-    # Match runs of printable characters (letters, digits, punctuation, spaces)
-    # but not control characters (except newline/tab)
-    parts = re.findall(r'[\w\s.,;:!?\'\"()\-\u00C0-\uFFFF]{4,}', raw_text)
-    if not parts:
-        return ""
+    # Map every unprintable byte to NUL, then split on NUL to get the runs
+    runs = decompressed.translate(_FALLBACK_TABLE).split(b"\x00")
+    parts = [run.decode("utf-8", errors="replace") for run in runs if len(run) >= 4]
     return " ".join(parts).strip()
 
 
-def _get_connection() -> sqlite3.Connection:
-    """Get a read-only connection to the Notes database."""
-    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+def _open_connection() -> sqlite3.Connection:
+    """Open a tuned read-only connection to the Notes database."""
+    # Pooled connections move between threadpool threads, but each is only
+    # ever used by one thread at a time
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Read-side tuning only; the journal mode is owned by Notes.app
+    conn.execute("PRAGMA cache_size = -65536")    # 64 MiB page cache
+    conn.execute("PRAGMA mmap_size = 268435456")  # 256 MiB
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 
+class _ConnPool:
+    """Bounded pool of read-only connections, opened lazily on demand.
+
+    FastAPI runs sync endpoints on a threadpool, so each concurrent request
+    borrows its own warm connection and hands it back when done.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._idle: queue.Queue[sqlite3.Connection] = queue.Queue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self._size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            # Pool is at capacity: wait for another request to finish
+            return self._idle.get()
+
+        try:
+            return _open_connection()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+
+_pool = _ConnPool(size=os.cpu_count() or 4)
+
+
+def _get_connection() -> AbstractContextManager[sqlite3.Connection]:
+    """Borrow a read-only connection to the Notes database from the pool.
+
+    Use as `with _get_connection() as conn:`. Don't hold one connection while
+    borrowing another, or a full pool can deadlock.
+    """
+    return _pool.connection()
+
+
 def get_folders() -> list[Folder]:
     """Get all non-deleted folders."""
-    conn = _get_connection()
-    try:
+    with _get_connection() as conn:
         cur = conn.execute("""
             SELECT
                 f.Z_PK as id,
@@ -190,14 +277,11 @@ def get_folders() -> list[Folder]:
             ORDER BY f.ZTITLE2
         """)
         return [Folder(id=r["id"], name=r["name"], note_count=r["note_count"]) for r in cur]
-    finally:
-        conn.close()
 
 
 def get_notes(folder_id: int | None = None) -> list[Note]:
     """Get all non-deleted notes, optionally filtered by folder."""
-    conn = _get_connection()
-    try:
+    with _get_connection() as conn:
         query = """
             SELECT
                 n.Z_PK as id,
@@ -205,11 +289,9 @@ def get_notes(folder_id: int | None = None) -> list[Note]:
                 n.ZSNIPPET as snippet,
                 n.ZCREATIONDATE3 as created,
                 n.ZMODIFICATIONDATE1 as modified,
-                n.ZFOLDER as folder_id,
                 n.ZISPINNED as is_pinned,
                 n.ZHASCHECKLIST as has_checklist,
-                f.ZTITLE2 as folder_name,
-                n.ZNOTEDATA as notedata_id
+                f.ZTITLE2 as folder_name
             FROM ZICCLOUDSYNCINGOBJECT n
             LEFT JOIN ZICCLOUDSYNCINGOBJECT f ON n.ZFOLDER = f.Z_PK
             WHERE n.ZTITLE1 IS NOT NULL
@@ -222,64 +304,240 @@ def get_notes(folder_id: int | None = None) -> list[Note]:
 
         query += " ORDER BY n.ZISPINNED DESC, n.ZMODIFICATIONDATE1 DESC"
 
-        cur = conn.execute(query, params)
-        notes = []
-        for r in cur:
-            notes.append(Note(
-                id=r["id"],
-                title=r["title"] or "",
-                snippet=r["snippet"] or "",
+        # Plain tuples: positional unpacking is cheaper than keyed sqlite3.Row access
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(query, params)
+        return [
+            Note(
+                id=note_id,
+                title=title or "",
+                snippet=snippet or "",
                 body="",  # loaded on demand via get_note()
-                folder=r["folder_name"] or "Notes",
-                created=_apple_timestamp_to_iso(r["created"]) or "",
-                modified=_apple_timestamp_to_iso(r["modified"]) or "",
-                is_pinned=bool(r["is_pinned"]),
-                has_checklist=bool(r["has_checklist"]),
-            ))
-        return notes
-    finally:
-        conn.close()
-
-
-def get_note(note_id: int) -> Note | None:
-    """Get a single note with its full body content."""
-    conn = _get_connection()
-    try:
-        cur = conn.execute("""
+                folder=folder_name or "Notes",
+                created=_apple_timestamp_to_iso(created) or "",
+                modified=_apple_timestamp_to_iso(modified) or "",
+                is_pinned=bool(is_pinned),
+                has_checklist=bool(has_checklist),
+            )
+            for (note_id, title, snippet, created, modified,
+                 is_pinned, has_checklist, folder_name) in cur
+        ]
+
+
+def note_exists(note_id: int) -> bool:
+    """Check whether a non-deleted note exists, without loading its body."""
+    with _get_connection() as conn:
+        return conn.execute("""
+            SELECT 1
+            FROM ZICCLOUDSYNCINGOBJECT
+            WHERE Z_PK = ?
+              AND ZTITLE1 IS NOT NULL
+              AND (ZMARKEDFORDELETION IS NULL OR ZMARKEDFORDELETION = 0)
+            LIMIT 1
+        """, (note_id,)).fetchone() is not None
+
+
+def _get_note_row(note_id: int) -> tuple | None:
+    """Read a note's metadata row (everything but the body) as a plain tuple.
+
+    Columns: id, modified, created, folder id, folder name, is_pinned,
+    has_checklist, title, snippet. Shared by get_note and get_note_etag so
+    the ETag is always computed from the same row a response is built from.
+    """
+    with _get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        return cur.execute("""
             SELECT
-                n.Z_PK as id,
-                n.ZTITLE1 as title,
-                n.ZSNIPPET as snippet,
-                n.ZCREATIONDATE3 as created,
-                n.ZMODIFICATIONDATE1 as modified,
-                n.ZISPINNED as is_pinned,
-                n.ZHASCHECKLIST as has_checklist,
-                f.ZTITLE2 as folder_name,
-                nd.ZDATA as body_data
+                n.Z_PK,
+                n.ZMODIFICATIONDATE1,
+                n.ZCREATIONDATE3,
+                n.ZFOLDER,
+                f.ZTITLE2,
+                n.ZISPINNED,
+                n.ZHASCHECKLIST,
+                n.ZTITLE1,
+                n.ZSNIPPET
             FROM ZICCLOUDSYNCINGOBJECT n
             LEFT JOIN ZICCLOUDSYNCINGOBJECT f ON n.ZFOLDER = f.Z_PK
-            LEFT JOIN ZICNOTEDATA nd ON nd.ZNOTE = n.Z_PK
             WHERE n.Z_PK = ?
               AND (n.ZMARKEDFORDELETION IS NULL OR n.ZMARKEDFORDELETION = 0)
-        """, (note_id,))
-        r = cur.fetchone()
-        if r is None:
-            return None
-
-        body = ""
-        if r["body_data"]:
-            body = _extract_text_from_protobuf(r["body_data"])
-
-        return Note(
-            id=r["id"],
-            title=r["title"] or "",
-            snippet=r["snippet"] or "",
-            body=body,
-            folder=r["folder_name"] or "Notes",
-            created=_apple_timestamp_to_iso(r["created"]) or "",
-            modified=_apple_timestamp_to_iso(r["modified"]) or "",
-            is_pinned=bool(r["is_pinned"]),
-            has_checklist=bool(r["has_checklist"]),
+        """, (note_id,)).fetchone()
+
+
+def _note_etag(row: tuple) -> str:
+    """Hash a metadata row from _get_note_row into an ETag.
+
+    Covers every field of the /notes/{id} response other than the body; the
+    body itself only changes along with the modification date.
+    """
+    return f'"{hashlib.blake2b(repr(row).encode(), digest_size=8).hexdigest()}"'
+
+
+def get_note_etag(note_id: int) -> str | None:
+    """Get an ETag for a note without loading its body.
+
+    Returns None if the note doesn't exist.
+    """
+    row = _get_note_row(note_id)
+    return _note_etag(row) if row is not None else None
+
+
+# Decoded note bodies keyed by (note_id, modification date), least recently
+# used first. Repeated reads of an unchanged note skip decompression and
+# protobuf parsing; editing a note bumps its modification date, which
+# naturally misses the cache.
+_BODY_CACHE_SIZE = 512
+_body_cache: OrderedDict[tuple[int, float | None], str] = OrderedDict()
+_body_cache_lock = threading.Lock()
+
+
+def _cached_body(key: tuple[int, float | None]) -> str | None:
+    """Look up a decoded body, marking it as recently used. None on a miss."""
+    with _body_cache_lock:
+        body = _body_cache.get(key)
+        if body is not None:
+            _body_cache.move_to_end(key)
+        return body
+
+
+def _cache_body(key: tuple[int, float | None], body: str) -> None:
+    """Store a decoded body, evicting the least recently used on overflow."""
+    with _body_cache_lock:
+        _body_cache[key] = body
+        _body_cache.move_to_end(key)
+        if len(_body_cache) > _BODY_CACHE_SIZE:
+            _body_cache.popitem(last=False)
+
+
+def _decode_body(body_data: bytes | None) -> str:
+    return _extract_text_from_protobuf(body_data) if body_data else ""
+
+
+def _get_note_body(note_id: int, modified: float | None) -> str:
+    """Load and decode a note body, going through the body cache."""
+    key = (note_id, modified)
+    body = _cached_body(key)
+    if body is not None:
+        return body
+
+    with _get_connection() as conn:
+        r = conn.execute(
+            "SELECT ZDATA FROM ZICNOTEDATA WHERE ZNOTE = ?", (note_id,)
+        ).fetchone()
+
+    body = _decode_body(r["ZDATA"] if r is not None else None)
+    _cache_body(key, body)
+    return body
+
+
+def get_note_with_etag(note_id: int) -> tuple[Note, str] | None:
+    """Get a single note with its full body content, plus its ETag."""
+    row = _get_note_row(note_id)
+    if row is None:
+        return None
+
+    (note_id, modified, created, _folder_id, folder_name,
+     is_pinned, has_checklist, title, snippet) = row
+    note = Note(
+        id=note_id,
+        title=title or "",
+        snippet=snippet or "",
+        body=_get_note_body(note_id, modified),
+        folder=folder_name or "Notes",
+        created=_apple_timestamp_to_iso(created) or "",
+        modified=_apple_timestamp_to_iso(modified) or "",
+        is_pinned=bool(is_pinned),
+        has_checklist=bool(has_checklist),
+    )
+    return note, _note_etag(row)
+
+
+def get_note(note_id: int) -> Note | None:
+    """Get a single note with its full body content."""
+    result = get_note_with_etag(note_id)
+    return result[0] if result is not None else None
+
+
+# SQLite builds before 3.32 cap bound parameters at 999 per statement
+_MAX_QUERY_PARAMS = 999
+
+# Shared pool for decoding bodies in get_notes_with_bodies; threads are
+# started on first use
+_decode_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix="note-decode"
+)
+
+
+def get_notes_with_bodies(ids: list[int]) -> list[Note]:
+    """Get several notes with their full body content.
+
+    Fetches the notes in as few queries as SQLite's parameter limit allows.
+    Bodies already in the body cache are reused; the rest are decompressed
+    and parsed across a thread pool (zlib releases the GIL). Notes come back
+    in the order of ids; missing or deleted ids are skipped.
+    """
+    rows = {}
+    with _get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        for i in range(0, len(ids), _MAX_QUERY_PARAMS):
+            batch = ids[i:i + _MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cur.execute(f"""
+                SELECT
+                    n.Z_PK as id,
+                    n.ZTITLE1 as title,
+                    n.ZSNIPPET as snippet,
+                    n.ZCREATIONDATE3 as created,
+                    n.ZMODIFICATIONDATE1 as modified,
+                    n.ZISPINNED as is_pinned,
+                    n.ZHASCHECKLIST as has_checklist,
+                    f.ZTITLE2 as folder_name,
+                    nd.ZDATA as body_data
+                FROM ZICCLOUDSYNCINGOBJECT n
+                LEFT JOIN ZICCLOUDSYNCINGOBJECT f ON n.ZFOLDER = f.Z_PK
+                LEFT JOIN ZICNOTEDATA nd ON nd.ZNOTE = n.Z_PK
+                WHERE n.Z_PK IN ({placeholders})
+                  AND (n.ZMARKEDFORDELETION IS NULL OR n.ZMARKEDFORDELETION = 0)
+            """, batch)
+            rows.update((r[0], r) for r in cur)
+
+    ordered = [rows[note_id] for note_id in ids if note_id in rows]
+
+    # Decode only the bodies missing from the cache, once per note
+    bodies = {}
+    misses = {}
+    for r in ordered:
+        key = (r[0], r[4])  # (id, modified)
+        body_data = r[8]
+        body = _cached_body(key)
+        if body is not None:
+            bodies[key] = body
+        else:
+            misses[key] = body_data
+
+    if len(misses) == 1:
+        decoded = [_decode_body(body_data) for body_data in misses.values()]
+    else:
+        decoded = _decode_executor.map(_decode_body, misses.values())
+    for key, body in zip(misses, decoded):
+        _cache_body(key, body)
+        bodies[key] = body
+
+    return [
+        Note(
+            id=note_id,
+            title=title or "",
+            snippet=snippet or "",
+            body=bodies[(note_id, modified)],
+            folder=folder_name or "Notes",
+            created=_apple_timestamp_to_iso(created) or "",
+            modified=_apple_timestamp_to_iso(modified) or "",
+            is_pinned=bool(is_pinned),
+            has_checklist=bool(has_checklist),
         )
-    finally:
-        conn.close()
+        for (note_id, title, snippet, created, modified,
+             is_pinned, has_checklist, folder_name, _) in ordered
+    ]
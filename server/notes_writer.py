@@ -5,9 +5,15 @@ Creates, edits, and deletes notes via osascript subprocess calls.
 
 import asyncio
 import json
+import logging
 import os
+import re
 import sqlite3
 import subprocess
+import uuid
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.expanduser(
     "~/Library/Group Containers/group.com.apple.notes/NoteStore.sqlite"
@@ -16,9 +22,37 @@ DB_PATH = os.path.expanduser(
 # Lock to prevent concurrent osascript calls
 _osascript_lock = asyncio.Lock()
 
+# Long-lived interactive osascript process, reused across _run_jxa calls
+_osascript_proc: asyncio.subprocess.Process | None = None
+
+# Seconds to wait for the persistent osascript to answer a script
+_OSASCRIPT_TIMEOUT = 60
+
+# Seconds to wait for the startup probe; kept short so a non-answering
+# interactive osascript doesn't hold up server startup
+_OSASCRIPT_PROBE_TIMEOUT = 5
+
+# Each script is sent to the REPL as one line: it is eval'd inside a function
+# (so its vars don't leak into later scripts), and the result or error is
+# percent-encoded behind a per-call token so it can be picked out of the
+# REPL's output regardless of how the REPL quotes it. encodeURIComponent
+# leaves !'()*~ alone, so those are escaped too, leaving only characters no
+# REPL would quote. The token prefix is split in the source so an echoed
+# input line never matches.
+_REPL_LINE = (
+    '(function(){{var r;try{{r={{result:String(eval({src}))}}}}'
+    'catch(e){{r={{error:String(e)}}}}'
+    'return "__end__"+":{token}:"+encodeURIComponent(JSON.stringify(r))'
+    ".replace(/[!'()*~]/g,c=>\"%\"+c.charCodeAt(0).toString(16));}})()"
+)
+_REPL_REPLY = re.compile(rb"^[-A-Za-z0-9%_.]*")
+
 # Cached store UUID
 _store_uuid: str | None = None
 
+# Cached AppleScript ID of the default account's "Notes" folder
+_default_folder_id: str | None = None
+
 
 def get_store_uuid() -> str:
     """Query the store UUID from Z_METADATA table. Cached after first call."""
@@ -47,18 +81,128 @@ def _note_id_from_pk(pk: int) -> str:
     return f"x-coredata://{uuid}/ICNote/p{pk}"
 
 
+def _folder_id_from_pk(pk: int) -> str:
+    """Convert a folder's SQLite Z_PK to an AppleScript-compatible folder ID.
+
+    The mapping is: x-coredata://{STORE_UUID}/ICFolder/p{Z_PK}
+    """
+    store_uuid = get_store_uuid()
+    return f"x-coredata://{store_uuid}/ICFolder/p{pk}"
+
+
+async def start_osascript() -> None:
+    """Start the persistent osascript process used by _run_jxa.
+
+    If interactive osascript can't be started or doesn't answer a probe
+    script, _run_jxa keeps spawning one osascript per call instead.
+    """
+    async with _osascript_lock:
+        try:
+            await _spawn_osascript()
+            await asyncio.wait_for(_eval_in_osascript('"ok"'), _OSASCRIPT_PROBE_TIMEOUT)
+        except (OSError, ValueError, RuntimeError, asyncio.TimeoutError) as e:
+            logger.warning(
+                "Persistent osascript unavailable (%r); "
+                "falling back to one osascript process per call", e
+            )
+            await _kill_osascript()
+
+
+async def stop_osascript() -> None:
+    """Shut down the persistent osascript process, if running."""
+    async with _osascript_lock:
+        await _kill_osascript()
+
+
+async def _spawn_osascript() -> None:
+    global _osascript_proc
+    _osascript_proc = await asyncio.create_subprocess_exec(
+        "osascript", "-l", "JavaScript", "-i",
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def _kill_osascript() -> None:
+    global _osascript_proc
+    proc, _osascript_proc = _osascript_proc, None
+    if proc is not None and proc.returncode is None:
+        proc.kill()
+        await proc.wait()
+
+
+async def _eval_in_osascript(script: str) -> str:
+    """Send one script to the persistent osascript and return its result.
+
+    Raises RuntimeError if the script throws. OSError or ValueError mean the
+    process itself is broken (exited, or sent an unreadable reply).
+    """
+    proc = _osascript_proc
+    token = uuid.uuid4().hex
+    line = _REPL_LINE.format(src=json.dumps(script), token=token)
+    proc.stdin.write(line.encode("utf-8") + b"\n")
+    await proc.stdin.drain()
+
+    marker = f"__end__:{token}:".encode()
+    while True:
+        out = await proc.stdout.readline()
+        if not out:
+            raise ConnectionError("osascript exited unexpectedly")
+        idx = out.find(marker)
+        if idx >= 0:
+            break
+
+    encoded = _REPL_REPLY.match(out[idx + len(marker):]).group()
+    reply = json.loads(unquote(encoded.decode("ascii")))
+    if "error" in reply:
+        raise RuntimeError(f"osascript failed: {reply['error']}")
+    return reply["result"].strip()
+
+
 async def _run_jxa(script: str) -> str:
     """Run a JXA script via osascript and return stdout.
 
-    Uses an asyncio lock to prevent concurrent osascript calls.
+    Scripts go to the persistent osascript process when it's running, which
+    avoids paying process startup and JXA bridge setup on every call. If that
+    process has died it is restarted; without it, a one-off osascript is
+    spawned per call. Uses an asyncio lock to prevent concurrent osascript
+    calls.
     """
     async with _osascript_lock:
-        proc = await asyncio.create_subprocess_exec(
-            "osascript", "-l", "JavaScript", "-e", script,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        stdout, stderr = await proc.communicate()
+        if _osascript_proc is None:
+            return await _run_jxa_once(script)
+
+        try:
+            if _osascript_proc.returncode is not None:
+                await _spawn_osascript()
+            return await asyncio.wait_for(
+                _eval_in_osascript(script), _OSASCRIPT_TIMEOUT
+            )
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            # Don't retry: the script may already have run. Restart the
+            # process so the next call gets a clean one.
+            await _kill_osascript()
+            try:
+                await _spawn_osascript()
+            except OSError:
+                pass
+            raise RuntimeError(f"osascript failed: {e!r}") from e
+
+
+async def _run_jxa_once(script: str) -> str:
+    """Run a JXA script in a one-off osascript process and return stdout.
+
+    The script is fed over stdin (osascript reads its program from stdin when
+    given no -e or file), so large note bodies aren't bound by argv limits.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "osascript", "-l", "JavaScript",
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate(script.encode("utf-8"))
 
     if proc.returncode != 0:
         error_msg = stderr.decode("utf-8", errors="replace").strip()
@@ -67,19 +211,26 @@ async def _run_jxa(script: str) -> str:
     return stdout.decode("utf-8", errors="replace").strip()
 
 
-async def create_note(title: str, body: str, folder: str = "Notes") -> dict:
+async def create_note(
+    title: str, body: str, folder: str = "Notes", folder_id: int | None = None
+) -> dict:
     """Create a new note in Apple Notes.
 
     Args:
         title: The note title.
         body: The note body in plain text. Newlines become <div> paragraphs.
         folder: The folder name to create the note in (default: "Notes").
+            Used when folder_id is not given or doesn't resolve.
+        folder_id: The SQLite Z_PK of the folder. Looked up directly by ID,
+            which avoids scanning every folder by name.
 
     Returns:
         dict with 'id' (int-ish from name) and 'name' of the created note.
     """
+    global _default_folder_id
+
     # Convert body text to HTML with <div> paragraphs
-    body_html = "".join(f"<div>{_escape_html(line) or '<br>'}</div>" for line in body.split("\n"))
+    body_html = _body_to_html(body)
     title_html = _escape_html(title)
 
     # Full HTML body includes title as first line
@@ -88,23 +239,41 @@ async def create_note(title: str, body: str, folder: str = "Notes") -> dict:
     # Escape for JS string embedding
     full_html_js = _escape_js_string(full_html)
     folder_js = _escape_js_string(folder)
+    folder_id_js = _escape_js_string(_folder_id_from_pk(folder_id)) if folder_id is not None else ""
+    default_id_js = _escape_js_string(_default_folder_id or "")
 
     script = f"""
         var app = Application("Notes");
-        var folder;
-        var folders = app.folders.whose({{name: "{folder_js}"}});
-        if (folders.length > 0) {{
-            folder = folders[0];
-        }} else {{
-            folder = app.defaultAccount().folders.whose({{name: "Notes"}})[0];
+        function folderById(id) {{
+            if (!id) return null;
+            var f = app.folders.byId(id);
+            try {{ f.name(); return f; }} catch (e) {{ return null; }}
+        }}
+        var defaultFolderId = null;
+        var folder = folderById("{folder_id_js}");
+        if (!folder) {{
+            var folders = app.folders.whose({{name: "{folder_js}"}});
+            if (folders.length > 0) {{
+                folder = folders[0];
+            }}
+        }}
+        if (!folder) {{
+            folder = folderById("{default_id_js}");
+            if (!folder) {{
+                folder = app.defaultAccount().folders.whose({{name: "Notes"}})[0];
+                defaultFolderId = folder.id();
+            }}
         }}
         var note = app.Note({{body: "{full_html_js}"}});
         folder.notes.push(note);
-        JSON.stringify({{id: note.id(), name: note.name()}});
+        JSON.stringify({{id: note.id(), name: note.name(), defaultFolderId: defaultFolderId}});
     """
 
-    result = await _run_jxa(script)
-    return json.loads(result)
+    result = json.loads(await _run_jxa(script))
+    default_folder_id = result.pop("defaultFolderId", None)
+    if default_folder_id:
+        _default_folder_id = default_folder_id
+    return result
 
 
 async def edit_note(note_id: int, body: str) -> None:
@@ -121,7 +290,7 @@ async def edit_note(note_id: int, body: str) -> None:
     coredata_id_js = _escape_js_string(coredata_id)
 
     # Convert body text to HTML
-    body_html = "".join(f"<div>{_escape_html(line) or '<br>'}</div>" for line in body.split("\n"))
+    body_html = _body_to_html(body)
     body_html_js = _escape_js_string(body_html)
 
     script = f"""
@@ -153,22 +322,38 @@ async def delete_note(note_id: int) -> None:
     await _run_jxa(script)
 
 
+_HTML_ESCAPES = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+})
+
+_JS_STRING_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    '"': '\\"',
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+})
+
+
+def _body_to_html(body: str) -> str:
+    """Convert plain text to HTML, one <div> per line (<br> for empty lines).
+
+    Escapes the whole body once and splits with str.replace, rather than
+    escaping and formatting line by line. Escaped text can't contain a
+    literal "<div>", so the empty-line patch only hits empty paragraphs.
+    """
+    html = "<div>" + _escape_html(body).replace("\n", "</div><div>") + "</div>"
+    return html.replace("<div></div>", "<div><br></div>")
+
+
 def _escape_html(text: str) -> str:
     """Escape HTML special characters."""
-    return (
-        text.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-    )
+    return text.translate(_HTML_ESCAPES)
 
 
 def _escape_js_string(text: str) -> str:
     """Escape a string for safe embedding in a JS double-quoted string literal."""
-    return (
-        text.replace("\\", "\\\\")
-            .replace('"', '\\"')
-            .replace("\n", "\\n")
-            .replace("\r", "\\r")
-            .replace("\t", "\\t")
-    )
+    return text.translate(_JS_STRING_ESCAPES)